@@ -1,25 +1,100 @@
 import re
 import os
+import json
 import csv
+import sys
+import array
 import types
+import tempfile
 import argparse
+import operator
+import concurrent.futures
 import datetime
+import functools
+import itertools
+import dataclasses
 import yaml
+from collections.abc import Callable, Iterable, Iterator
 
 
 CATEGORIES_DATABASE = 'categories.yaml'
+CATEGORIES_CACHE = 'categories.json'
+DATE_PATTERN = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
 
 
+@functools.lru_cache(maxsize=8192)
 def date(arg: str) -> datetime.date:
     """Defines the date data type
 
     Args:
         arg (str): the raw string of a date formatted as MM/DD/YYYY
 
+    Raises:
+        ValueError: if arg is not formatted as MM/DD/YYYY or is not a valid date
+
     Returns:
         datetime.date: a date object of the passed arg
     """
-    return datetime.datetime.strptime(arg, '%m/%d/%Y')
+    match: re.Match | None = DATE_PATTERN.fullmatch(arg)
+    if match is None:
+        raise ValueError(f'{arg} is not formatted as MM/DD/YYYY')
+    month, day, year = map(int, match.groups())
+    return datetime.date(year, month, day)
+
+
+@functools.cache
+def load_translations() -> dict[str, list[str]]:
+    """Loads the category conversions from the categories database. The parsed conversions are cached as JSON
+    next to the database along with the database's modification time and size, and reused only while both still
+    match. A cache that is unreadable, malformed, or stale is ignored and rebuilt.
+
+    Returns:
+        dict[str, list[str]]: each budgeting category mapped to the statement categories that translate to it
+    """
+    database_stat: os.stat_result = os.stat(CATEGORIES_DATABASE)
+    signature: list[int] = [database_stat.st_mtime_ns, database_stat.st_size]
+    try:
+        with open(CATEGORIES_CACHE, 'r', encoding='utf-8') as cache:
+            cached = json.load(cache)
+        if isinstance(cached, dict) and cached.get('database') == signature and isinstance(cached.get('conversions'), dict) \
+                and all(isinstance(categories, list | None) for categories in cached['conversions'].values()):
+            return cached['conversions']
+    except (OSError, json.JSONDecodeError):
+        pass
+    with open(CATEGORIES_DATABASE, 'r', encoding='utf-8') as database:
+        translations: dict[str, list[str]] = list(yaml.load_all(database, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)))[0]['Conversions']
+    cache_path: str | None = None
+    try:
+        # written to a temporary file first so a reader never sees a partially written cache
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tmp', delete=False,
+                dir=os.path.dirname(os.path.abspath(CATEGORIES_CACHE))) as cache:
+            cache_path = cache.name
+            json.dump({'database': signature, 'conversions': translations}, cache)
+        # temporary files are created owner-only; give the cache the permissions of a normally created file
+        umask: int = os.umask(0)
+        os.umask(umask)
+        os.chmod(cache_path, 0o666 & ~umask)
+        os.replace(cache_path, CATEGORIES_CACHE)
+    except OSError:
+        print(f'MESSAGE: could not cache categories to {CATEGORIES_CACHE}')
+        if cache_path is not None and os.path.exists(cache_path):
+            os.remove(cache_path)
+    return translations
+
+
+@functools.cache
+def load_category_lookup() -> dict[str, str]:
+    """Inverts the category conversions so that any statement category translates with a single lookup
+
+    Returns:
+        dict[str, str]: each budgeting category and statement category mapped to the budgeting category it translates to
+    """
+    lookup: dict[str, str] = {}
+    for true_category, categories in load_translations().items():
+        lookup.setdefault(true_category, true_category)
+        for category in categories or ():
+            lookup.setdefault(category, true_category)
+    return lookup
 
 
 def type_statements(arg: str) -> list[str]:
@@ -33,11 +108,8 @@ def type_statements(arg: str) -> list[str]:
     """
     if ',' in arg:
         return arg.split(',')
-    return [
-        os.path.join(arg, f) \
-        for f in os.listdir(arg) \
-            if os.path.isfile(os.path.join(arg, f))
-    ]
+    with os.scandir(arg) as entries:
+        return [entry.path for entry in entries if entry.is_file()]
 
 
 def get_arguements() -> argparse.Namespace:
@@ -87,49 +159,83 @@ def get_arguements() -> argparse.Namespace:
     return parser.parse_args()
 
 
+@dataclasses.dataclass
+class Statement:
+    """A standardized statement stored as parallel columns, where index i of every column describes entry i"""
+    date: list[str] = dataclasses.field(default_factory=list)
+    description: list[str] = dataclasses.field(default_factory=list)
+    amount: array.array = dataclasses.field(default_factory=lambda: array.array('d'))
+    category: list[str] = dataclasses.field(default_factory=list)
+    parsed_date: list[datetime.date] = dataclasses.field(default_factory=list)
+
+
+    def append(self, raw_date: str, description: str, amount: float, category: str, parsed_date: datetime.date) -> None:
+        """Adds a single entry to the end of every column
+
+        Args:
+            raw_date (str): the date of the entry formatted as MM/DD/YYYY
+            description (str): the description of the entry
+            amount (float): the amount of the entry
+            category (str): the category of the entry
+            parsed_date (datetime.date): the date of the entry, already parsed
+        """
+        self.date.append(raw_date)
+        self.description.append(description)
+        self.amount.append(amount)
+        self.category.append(category)
+        self.parsed_date.append(parsed_date)
+
+
+    def rows(self) -> Iterator[tuple[str, str, float, str]]:
+        """Iterates over the entries of the statement
+
+        Returns:
+            Iterator[tuple[str, str, float, str]]: the date, description, amount, and category of each entry
+        """
+        return zip(self.date, self.description, self.amount, self.category)
+
+
 class TransactionAggregator:
 
     def __init__(self, bank_statements: list[str], discover_credit_statements: list[str],
-                file: str, start_date: tuple[int, int, int], end_date: tuple[int, int, int]):
+                file: str, start_date: datetime.date, end_date: datetime.date):
         """Class constructor
 
         Args:
             bank_statements (list[str]): all bank statements used in this call
             discover_credit_statements (list[str]): all discover credit statements used in this call
             file (str): name of the outputted CSV file
-            start_date (tuple[int, int, int]): the day, month, and year to consider as a starting point when processing specific methods
-            end_date (tuple[int, int, int]): the day, month, and year to consider as a cut-off when processing specific methods
+            start_date (datetime.date): the date to consider as a starting point when processing specific methods
+            end_date (datetime.date): the date to consider as a cut-off when processing specific methods
         """
         self.__file: str = file
-        self.__start_date: tuple[int, int, int] = start_date
-        self.__end_date: tuple[int, int, int] = end_date
-        self.__bank_statements: list[list[dict[str, str | float]]] = self.__clean_statements(bank_statements, is_bank=True)
-        self.__discover_credit_statements: list[list[dict[str, str | float]]] = self.__clean_statements(discover_credit_statements, is_discover=True)
+        self.__start_date: datetime.date = start_date
+        self.__end_date: datetime.date = end_date
+        self.__category_lookup: dict[str, str] = load_category_lookup()
+        # shared by every statement so a merchant repeated across statements is stored once; dict.setdefault with
+        # str keys is atomic under the GIL, so the converters may fill it from concurrent reads
+        self.__descriptions: dict[str, str] = {}
+        self.__bank_statements: list[Statement] = self.__clean_statements(bank_statements, is_bank=True)
+        self.__discover_credit_statements: list[Statement] = self.__clean_statements(discover_credit_statements, is_discover=True)
         
 
-    def __read_statement(self, statement_file: str, converter: types.FunctionType | None) -> list[dict[str, str | float]]:
+    def __read_statement(self, statement_file: str, converter: types.MethodType | None) -> tuple[Statement, list[str]] | list[dict[str, str]]:
         """Reads in a single statement from a CSV. If flag is specified, processes it to standardized format. Otherwise, only takes in raw CSV format.
 
         Args:
             statement_file (str): the file path to the CSV
-            converter (types.FunctionType | None): a function to convert the raw statement into the standardize form. If None, return raw_statement.
+            converter (types.MethodType | None): a method to convert the raw statement into the standardize form. If None, return raw_statement.
 
         Returns:
-            list[dict[str, str | float]]: the contents of the CSV
+            tuple[Statement, list[str]] | list[dict[str, str]]: the converted contents of the CSV and the categories not
+            found in the database, or the raw contents of the CSV if no converter is given
         """
-        with open(statement_file) as csv_file:
-            statement = csv.reader(csv_file, delimiter=',')
-            raw_statement: list[list[str]] = [entry for entry in statement]
-            keys: list[str] = raw_statement[0]
-            raw_statement = raw_statement[1:]
-            typed_statement: list[dict[str, str | float]] = []
-            for entry_id in range(len(raw_statement)):
-                entry: list[str] = raw_statement[entry_id]
-                raw_statement[entry_id] = {keys[element_id]: entry[element_id] for element_id in range(len(entry))}
-            return raw_statement if converter is None else converter(raw_statement)
-
-
-    def __clean_statements(self, statements: list[str], is_discover=False, is_bank=False) -> list[list[dict[str, str | float]]]:
+        with open(statement_file, 'r', buffering=1 << 20, newline='') as csv_file:
+            raw_statement: csv.DictReader = csv.DictReader(csv_file, delimiter=',')
+            return list(raw_statement) if converter is None else converter(raw_statement)
+
+
+    def __clean_statements(self, statements: list[str], is_discover=False, is_bank=False) -> list[Statement]:
         """Processes the given statement files from raw format to budget-friendly format
 
         Args:
@@ -138,48 +244,34 @@ class TransactionAggregator:
             is_bank (bool, optional): signals if this is a bank statement being processed. Defaults to False.
 
         Returns:
-            list[list[dict[str, str | float]]]: the list of statement CSVs read in and converted to budgeting format.
+            list[Statement]: the list of statement CSVs read in and converted to budgeting format.
         """
-        processed_statements = None
         if statements is None:
             return None
-        if is_bank:
-            processed_statements = self.__filter_statements(self.__read_in_statements(statements, is_bank=True))
-        elif is_discover:
-            processed_statements = self.__filter_statements(self.__read_in_statements(statements, is_discover=True))
-        
-        return self.__translate_categories(processed_statements)
+        return self.__read_in_statements(statements, is_discover=is_discover, is_bank=is_bank)
 
 
     #TODO: Only does direct 1-1 translation. In the future, should consider price and possibly description/tags.
-    def __translate_categories(self, statements: list[list[dict[str, str | float]]]) -> list[list[dict[str, str | float]]]:
-        """Translates the raw categories from the statements into personal budgeting categories.
+    def __translate_category(self, category: str, unmatched_categories: list[str]) -> str:
+        """Translates a raw category from a statement into a personal budgeting category.
 
         Args:
-            statements (list[list[dict[str, str  |  float]]]): statements processed into standardized JSON format
+            category (str): the category as given by the statement
+            unmatched_categories (list[str]): where categories not found in the database are recorded
 
         Returns:
-            list[list[dict[str, str | float]]]: The same statements passed but categories translated
+            str: the budgeting category shared by every entry translated to it, or the interned raw category if it is
+            not found in the database
         """
-        with open(CATEGORIES_DATABASE, 'r', encoding='utf-8') as translations:
-            translations = list(yaml.safe_load_all(translations))
-            translations = translations[0]['Conversions']
-            for statement_id in range(len(statements)):
-                for entry_id in range(len(statements[statement_id])):
-                    entry = statements[statement_id][entry_id]
-                    found_match: bool = False
-                    for true_category in translations.keys():
-                        if entry['Category'] == true_category or entry['Category'] in translations[true_category]:
-                            entry['Category'] = true_category
-                            found_match = True
-                            break
-                    if not found_match:
-                        print(f'MESSAGE: {entry['Category']} not found in database')
-                    statements[statement_id][entry_id] = entry
-            return statements
-
-
-    def __read_in_statements(self, statements: list[str], is_discover: bool=False, is_bank: bool=False) -> list[list[dict[str, str | float]]]:
+        true_category: str | None = self.__category_lookup.get(category)
+        if true_category is None:
+            category = sys.intern(category)
+            unmatched_categories.append(category)
+            return category
+        return true_category
+
+
+    def __read_in_statements(self, statements: list[str], is_discover: bool=False, is_bank: bool=False) -> list[Statement | list[dict[str, str]]]:
         """Reads in all statement CSVs. If flag is specified, processes it to standardized format. Otherwise, only takes in raw CSV format.
 
         Args:
@@ -188,84 +280,122 @@ class TransactionAggregator:
             is_bank (bool, optional): flag signifies this is a bank statement. Defaults to False.
 
         Returns:
-            list[list[dict[str, str | float]]]: all CSVs of statements read in
+            list[Statement | list[dict[str, str]]]: all CSVs of statements read in
         """
         if is_discover and is_bank:
             raise RuntimeError('statement cannot be both a discover and bank statement')
         
-        return [
-            self.__read_statement(
-                statement,
-                self.__convert_discover_statement if is_discover \
-                    else self.__convert_bank_statement if is_bank \
-                    else None
-            ) \
-            for statement in statements
-        ]
+        converter: types.MethodType | None = self.__convert_discover_statement if is_discover \
+            else self.__convert_bank_statement if is_bank \
+            else None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, len(statements) or 1)) as executor:
+            read_statements: list[tuple[Statement, list[str]] | list[dict[str, str]]] = list(
+                executor.map(self.__read_statement, statements, itertools.repeat(converter))
+            )
+        if converter is None:
+            return read_statements
+        # reported from this thread, in statement order, so messages from concurrent reads never interleave
+        for _, unmatched_categories in read_statements:
+            for category in unmatched_categories:
+                print(f'MESSAGE: {category} not found in database')
+        return [statement for statement, _ in read_statements]
+
+    def __convert_statement(self, statement: Iterable[dict[str, str]], date_key: str, category_key: str,
+                            parse_amount: Callable[[dict[str, str]], float]) -> tuple[Statement, list[str]]:
+        """Converts a statement to the standardized format. Entries dated outside of the provided range of dates are
+        omitted and categories are translated to budgeting categories.
+
+        Args:
+            statement (Iterable[dict[str, str]]): the raw statement
+            date_key (str): the column holding each entry's date
+            category_key (str): the column holding each entry's category
+            parse_amount (Callable[[dict[str, str]], float]): reads the amount of a raw entry
+
+        Returns:
+            tuple[Statement, list[str]]: the standard formatted statement and the categories not found in the database
+        """
+        start_date, end_date = self.__start_date, self.__end_date
+        translate_category: types.MethodType = self.__translate_category
+        standard_statement: Statement = Statement()
+        append: types.MethodType = standard_statement.append
+        unmatched_categories: list[str] = []
+        pool_description: types.BuiltinMethodType = self.__descriptions.setdefault
+        for entry in statement:
+            raw_date: str = entry[date_key]
+            entry_date: datetime.date = date(raw_date)
+            if not start_date <= entry_date <= end_date:
+                continue
+            description: str = entry['Description']
+            append(
+                raw_date,
+                pool_description(description, description),
+                parse_amount(entry),
+                translate_category(entry[category_key], unmatched_categories),
+                entry_date
+            )
+        return standard_statement, unmatched_categories
+
+
+    @staticmethod
+    def __parse_bank_amount(entry: dict[str, str]) -> float:
+        """Reads the amount of a bank entry; debits are positive and credits are negative
+
+        Args:
+            entry (dict[str, str]): the raw bank entry
+
+        Returns:
+            float: the amount of the entry
+        """
+        debit: str = entry['Debit']
+        return float(debit) if debit else -float(entry['Credit'])
+
+
+    @staticmethod
+    def __parse_discover_amount(entry: dict[str, str]) -> float:
+        """Reads the amount of a discover entry, which may contain thousands separators
+
+        Args:
+            entry (dict[str, str]): the raw discover entry
+
+        Returns:
+            float: the amount of the entry
+        """
+        amount: str = entry['Amount']
+        return float(amount.replace(',', '') if ',' in amount else amount)
+
 
     #NOTE: In the future, will need to refactor for First Source bank statements.
-    def __convert_bank_statement(self, statement: list[dict[str, str | float]]) -> list[dict[str, str | float]]:
-        for entry_id in range(len(statement)):
-            entry: dict[str, str | float] = statement[entry_id]
-            del entry['Account Number']
-            del entry['Check']
-            del entry['Status']
-            del entry['Balance']
-            statement[entry_id]: dict[str, str | float] = {
-                'Date': entry.pop('Post Date'),
-                'Description': entry.pop('Description'),
-                'Amount': float(entry.pop('Debit') if not entry['Debit'] == '' else '-' + entry.pop('Credit')),
-                'Category': entry.pop('Classification')
-            }
-        return statement
-
-
-    def __convert_discover_statement(self, statement: list[dict[str, str | float]]) -> list[dict[str, str | float]]:
-        """Converts discover's statement format to a standardized one
+    def __convert_bank_statement(self, statement: Iterable[dict[str, str]]) -> tuple[Statement, list[str]]:
+        """Converts the bank's statement format to a standardized one. Entries dated outside of the provided
+        range of dates are omitted and categories are translated to budgeting categories.
 
         Args:
-            statement (list[dict[str, str  |  float]]): the discover formatted statement
+            statement (Iterable[dict[str, str]]): the bank formatted statement
 
         Returns:
-            list[dict[str, str | float]]: the standard formatted statement
+            tuple[Statement, list[str]]: the standard formatted statement and the categories not found in the database
         """
-        for entry_id in range(len(statement)):
-            entry: dict[str, str | float] = statement[entry_id]
-            del entry['Post Date']
-            statement[entry_id]: dict[str, str | float] = {
-                'Date': entry.pop('Trans. Date'),
-                'Description': entry.pop('Description'),
-                'Amount': float(entry.pop('Amount').replace(',', '')),
-                'Category': entry.pop('Category')
-            }
-        return statement
-
-
-    def __filter_statements(self, statements: list[list[dict[str, str | float]]]) -> list[list[dict[str, str | float]]]:
-        """Filters statement entries by their dates. If they are not within the given range of dates provided by the parsed
-        arguments, they are omitted in the rest of the operation.
+        return self.__convert_statement(statement, 'Post Date', 'Classification', self.__parse_bank_amount)
+
+
+    def __convert_discover_statement(self, statement: Iterable[dict[str, str]]) -> tuple[Statement, list[str]]:
+        """Converts discover's statement format to a standardized one. Entries dated outside of the provided
+        range of dates are omitted and categories are translated to budgeting categories.
 
         Args:
-            statements (list[list[dict[str, str  |  float]]]): A list of statements
+            statement (Iterable[dict[str, str]]): the discover formatted statement
 
         Returns:
-            list[list[dict[str, str | float]]]: The same list of statements passed to the method but filtered to only include
-            entries with dates in the provided range.
+            tuple[Statement, list[str]]: the standard formatted statement and the categories not found in the database
         """
-        for statement_id in range(len(statements)):
-            statements[statement_id] = [
-                statements[statement_id][entry_id]
-                for entry_id in range(len(statements[statement_id])) \
-                if date(statements[statement_id][entry_id]['Date']) >= self.__start_date and date(statements[statement_id][entry_id]['Date']) <= self.__end_date
-            ]
-        return statements
+        return self.__convert_statement(statement, 'Trans. Date', 'Category', self.__parse_discover_amount)
 
 
-    def get_discover_statements(self) -> list[dict[str, str | float]]:
+    def get_discover_statements(self) -> list[Statement]:
         """Gets list of all discover credit statements
 
         Returns:
-            list[list[str]]: The discover credit statements read in
+            list[Statement]: The discover credit statements read in
         """
         return self.__discover_credit_statements
 
@@ -284,22 +414,21 @@ class TransactionAggregator:
             all_entries = []
             if self.__discover_credit_statements is not None:
                 for statement in self.__discover_credit_statements:
-                    for entry in statement:
-                        all_entries.append([entry[element] for element in attributes])
+                    all_entries.extend([*entry, parsed_date] for entry, parsed_date in zip(statement.rows(), statement.parsed_date))
             if self.__bank_statements is not None:
                 for statement in self.__bank_statements:
-                    for entry in statement:
-                        all_entries.append([entry[element] for element in attributes])
-            all_entries.sort(reverse=True, key=lambda entry: date(entry[0]))
-            with open(self.__file + '_google_sheets.csv', 'w', newline='', encoding='utf-8') as csv_file:
-                writer = csv.writer(csv_file, delimiter=',')
-                for entry in all_entries:
-                    row = [str(entry[1]), str(entry[3]), None, str(entry[2]), None, str(entry[2]), None, None, None, str(entry[0])]
-                    writer.writerow(row)
-            with open(self.__file + '.csv', 'w', newline='', encoding='utf-8') as csv_file:
-                writer = csv.writer(csv_file, delimiter=',')
-                writer.writerow(attributes)
-                writer.writerows(all_entries)
+                    all_entries.extend([*entry, parsed_date] for entry, parsed_date in zip(statement.rows(), statement.parsed_date))
+            all_entries.sort(reverse=True, key=operator.itemgetter(4))
+            with open(self.__file + '_google_sheets.csv', 'w', buffering=1 << 20, newline='', encoding='utf-8') as google_sheets_file, \
+                    open(self.__file + '.csv', 'w', buffering=1 << 20, newline='', encoding='utf-8') as analysis_file:
+                google_sheets_writer = csv.writer(google_sheets_file, delimiter=',')
+                google_sheets_writer.writerows(
+                    [entry[1], entry[3], None, entry[2], None, entry[2], None, None, None, entry[0]] \
+                    for entry in all_entries
+                )
+                analysis_writer = csv.writer(analysis_file, delimiter=',')
+                analysis_writer.writerow(attributes)
+                analysis_writer.writerows(entry[:4] for entry in all_entries)
 
             return True
         except: